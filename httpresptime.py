@@ -14,120 +14,496 @@ Sending requests: .....
 Response times (s): min: 0.0562 max: 0.0647 avg: 0.0607
 """
 
+import os
+import sys
 import time
 import argparse
 import datetime
 import requests
 import socket
-from urllib.parse import urlparse
+import statistics
+import functools
+import importlib
+from urllib.parse import urlsplit
 # Disable warnings about not doing SSL verification
 import urllib3
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 REQUEST_TIMEOUT = 30
+READ_CHUNK_SIZE = 65536
+# Sample count from which numpy is used for calculating response times
+NUMPY_THRESHOLD = 100000
+# Headers sent with every request, updated from the command line options
+REQUEST_HEADERS = {}
 CHROME_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/51.0.2704.103 Safari/537.36'
 
 
-def request_headers(headers={}):
-    """Permanent store for request headers.
+@functools.lru_cache(maxsize=None)
+def import_optional(name):
+    """Import an optional dependency on first use, None if it is not installed.
 
-    Returns a dict of request headers that can be updated for future calls.
+    Optional dependencies are only imported by the modes that use them to
+    keep startup fast.
     """
-    return headers
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def import_httpx():
+    """Import httpx if it is installed with HTTP/2 support, None if not."""
+    if import_optional('h2') is None:
+        return None
+    return import_optional('httpx')
 
 
 def get_redirected_url(url):
     """Get the final redirected URL for en URL."""
-    resp = requests.get(url, verify=False, headers=request_headers(), timeout=REQUEST_TIMEOUT)
+    httpx = import_httpx()
+    if httpx is not None:
+        resp = httpx.get(url, verify=False, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT,
+                         follow_redirects=True)
+        return str(resp.url)
+    resp = requests.get(url, verify=False, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT)
     return resp.url
 
 
-def get_url_hostname(url):
-    """Return the hostname part of an URL."""
-    p_url = urlparse(url)
-    return p_url.hostname
+@functools.lru_cache(maxsize=32)
+def resolve_host(hostname):
+    """Return the IPv4 and IPv6 addresses for a hostname.
+
+    The addresses are in getaddrinfo's order of preference (RFC 6724).
+    """
+    infos = socket.getaddrinfo(hostname, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    return tuple(dict.fromkeys(info[4][0] for info in infos))
+
+
+def pin_host_addresses(hostname, addresses):
+    """Make new urllib3 connections to hostname use addresses.
 
+    The addresses are tried in order, like urllib3 does with the result of
+    its own lookup. This keeps DNS lookups out of the measurements when new
+    connections are made for each request.
+    """
+    create_connection = urllib3.util.connection.create_connection
+
+    def pinned_create_connection(host_port, *args, **kwargs):
+        host, port = host_port
+        if host != hostname:
+            return create_connection(host_port, *args, **kwargs)
+        for address in addresses[:-1]:
+            try:
+                return create_connection((address, port), *args, **kwargs)
+            except OSError:
+                pass
+        return create_connection((addresses[-1], port), *args, **kwargs)
+
+    urllib3.util.connection.create_connection = pinned_create_connection
+
+
+def new_session():
+    """Create a keepalive session.
+
+    A HTTP/2 capable httpx client is used when httpx is installed, otherwise
+    a urllib3 pool manager.
+    """
+    httpx = import_httpx()
+    if httpx is not None:
+        return httpx.Client(http2=True, verify=False, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT)
+    # Ask for the same encodings as requests and httpx, urllib3 does not
+    # send an Accept-Encoding header by default
+    headers = {**urllib3.make_headers(accept_encoding=True), **REQUEST_HEADERS}
+    return urllib3.PoolManager(num_pools=1, maxsize=1, cert_reqs='CERT_NONE', headers=headers,
+                               timeout=REQUEST_TIMEOUT, retries=False)
 
-def time_url(url, num_requests=10, display_progress=True, use_keepalive=True):
-    """Perform response time measurements for an URL."""
-    if use_keepalive:
-        session = requests.Session()
-        session.get(url, verify=False, headers=request_headers(), timeout=REQUEST_TIMEOUT)
+
+def close_session(session):
+    """Close a session created by new_session."""
+    if isinstance(session, urllib3.PoolManager):
+        session.clear()
     else:
-        session = requests
-    resp_times = []
+        session.close()
+
+
+def fetch_requests(url):
+    """Send a GET request on a new connection using requests."""
+    size = 0
+    r = requests.get(url, verify=False, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT, stream=True)
+    for chunk in r.raw.stream(READ_CHUNK_SIZE, decode_content=True):
+        size += len(chunk)
+    r.raw.release_conn()
+    return r.status_code, size
+
+
+def fetch_urllib3(pool, url):
+    """Send a GET request using a urllib3 pool manager."""
+    size = 0
+    r = pool.request('GET', url, preload_content=False, redirect=False)
+    for chunk in r.stream(READ_CHUNK_SIZE, decode_content=True):
+        size += len(chunk)
+    r.release_conn()
+    return r.status, size
+
+
+def fetch_httpx(client, url):
+    """Send a GET request using a httpx client."""
+    size = 0
+    with client.stream('GET', url, timeout=REQUEST_TIMEOUT) as r:
+        for chunk in r.iter_bytes(READ_CHUNK_SIZE):
+            size += len(chunk)
+    return r.status_code, size
+
+
+def get_fetcher(url, session=None):
+    """Return a function sending a GET request for an URL.
+
+    The request uses session if given or a new connection if not. The
+    response body is read as bytes, only the content encoding is undone and
+    no text decoding is done. The function returns the status code and the
+    body size in bytes after content decoding, checking the status is left
+    to the caller.
+    """
+    if session is None:
+        return functools.partial(fetch_requests, url)
+    if isinstance(session, urllib3.PoolManager):
+        return functools.partial(fetch_urllib3, session, url)
+    return functools.partial(fetch_httpx, session, url)
+
+
+def fetch(url, session=None):
+    """Send a single GET request as described in get_fetcher."""
+    return get_fetcher(url, session)()
+
+
+def http_error(url, status_code):
+    """Return a requests.HTTPError for an error status code, like raise_for_status.
+
+    Only the status code and URL are known for every backend, so the error
+    carries a response with just those set.
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    return requests.HTTPError(f'{status_code} Error for url: {url}', response=response)
+
+
+def warm_session(url):
+    """Create a keepalive session with an open connection for an URL."""
+    session = new_session()
+    try:
+        fetch(url, session)
+    except Exception:
+        close_session(session)
+        raise
+    return session
+
+
+def get_redirected_url_and_session(url):
+    """Get the final redirected URL for an URL and a warmed up session for it.
+
+    The redirects are followed while a keepalive session is warmed up for
+    the original URL in parallel. If the redirect leads to another origin
+    the session is warmed up again for the final URL.
+    """
+    import concurrent.futures
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        redir_future = executor.submit(get_redirected_url, url)
+        session_future = executor.submit(warm_session, url)
+        try:
+            redir_url = redir_future.result()
+        except Exception:
+            if session_future.exception() is None:
+                close_session(session_future.result())
+            raise
+        session = session_future.result()
+    p_url = urlsplit(url)
+    p_redir_url = urlsplit(redir_url)
+    if (p_url.scheme, p_url.netloc) != (p_redir_url.scheme, p_redir_url.netloc):
+        try:
+            fetch(redir_url, session)
+        except Exception:
+            close_session(session)
+            raise
+    return redir_url, session
+
+
+def time_url(url, num_requests=10, display_progress=True, use_keepalive=True, session=None):
+    """Perform response time measurements for an URL.
+
+    Only the min, max and average times are kept, no list of samples. If a
+    session is given it must already be warmed up for the URL, it is
+    used instead of a new session and is closed when done.
+    """
+    warm_up = session is None and use_keepalive
+    if warm_up:
+        session = new_session()
+    min_time = float('inf')
+    max_time = float('-inf')
+    total_time = 0
     if display_progress:
         print('Sending requests: ', end='', flush=True)
-    for _ in range(num_requests):
-        start = time.time()
-        r = session.get(url, verify=False, headers=request_headers(), timeout=REQUEST_TIMEOUT)
-        end = time.time()
-        resp_times.append(end - start)
-        r.raise_for_status()
+        # Progress is written straight to the file descriptor, a single
+        # unbuffered write per request
+        progress_fd = sys.stdout.fileno()
+    try:
+        # Bind everything used in the request loop up front so that only the
+        # request itself is left inside it
+        get = get_fetcher(url, session)
+        perf_counter_ns = time.perf_counter_ns
+        if warm_up:
+            get()
+        # The loop is written out twice so that the loop without progress
+        # output does not test display_progress on every request
+        if display_progress:
+            for _ in range(num_requests):
+                start = perf_counter_ns()
+                status_code, size = get()
+                resp_time = perf_counter_ns() - start
+                if resp_time < min_time:
+                    min_time = resp_time
+                if resp_time > max_time:
+                    max_time = resp_time
+                total_time += resp_time
+                if status_code >= 400:
+                    raise http_error(url, status_code)
+                os.write(progress_fd, b'.')
+        else:
+            for _ in range(num_requests):
+                start = perf_counter_ns()
+                status_code, size = get()
+                resp_time = perf_counter_ns() - start
+                if resp_time < min_time:
+                    min_time = resp_time
+                if resp_time > max_time:
+                    max_time = resp_time
+                total_time += resp_time
+                if status_code >= 400:
+                    raise http_error(url, status_code)
+    finally:
+        if session is not None:
+            close_session(session)
+    if display_progress:
+        print()
+    ret = {'min_time': min_time / 1e9, 'max_time': max_time / 1e9, 'avg_time': total_time / num_requests / 1e9}
+    ret['last_status_code'] = status_code
+    ret['last_size'] = size
+    return ret
+
+
+def time_url_curl(url, num_requests=10, display_progress=True, use_keepalive=True):
+    """Perform response time measurements for an URL using libcurl.
+
+    The requests are sent by libcurl and the response times are taken from
+    its own timers, which keeps the Python overhead out of the measurements.
+    """
+    pycurl = import_optional('pycurl')
+    c = pycurl.Curl()
+    c.setopt(pycurl.URL, url)
+    c.setopt(pycurl.SSL_VERIFYPEER, 0)
+    c.setopt(pycurl.SSL_VERIFYHOST, 0)
+    c.setopt(pycurl.TIMEOUT, REQUEST_TIMEOUT)
+    if pycurl.version_info()[4] & pycurl.VERSION_HTTP2:
+        c.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+    c.setopt(pycurl.HTTPHEADER, [f'{key}: {value}' for key, value in REQUEST_HEADERS.items()])
+    # Ask for the same encodings as the other backends, libcurl does not
+    # send an Accept-Encoding header by default
+    c.setopt(pycurl.ACCEPT_ENCODING, requests.utils.DEFAULT_ACCEPT_ENCODING)
+    # The body size is counted from the data handed over by libcurl, which is
+    # decoded, unlike SIZE_DOWNLOAD_T
+    size = 0
+
+    def write(data):
+        nonlocal size
+        size += len(data)
+
+    c.setopt(pycurl.WRITEFUNCTION, write)
+    if not use_keepalive:
+        c.setopt(pycurl.FORBID_REUSE, 1)
+    resp_times = []
+    try:
+        if use_keepalive:
+            c.perform()
         if display_progress:
-            print('.', end='', flush=True)
+            print('Sending requests: ', end='', flush=True)
+            progress_fd = sys.stdout.fileno()
+        for _ in range(num_requests):
+            size = 0
+            c.perform()
+            # TOTAL_TIME_T is in microseconds
+            resp_times.append(c.getinfo(pycurl.TOTAL_TIME_T) * 1000)
+            status_code = c.getinfo(pycurl.RESPONSE_CODE)
+            if status_code >= 400:
+                raise http_error(url, status_code)
+            if display_progress:
+                os.write(progress_fd, b'.')
+    finally:
+        c.close()
     if display_progress:
         print()
     ret = calc_resp_times(resp_times)
-    ret['last_status_code'] = r.status_code
-    ret['last_size'] = len(r.text)
+    ret['last_status_code'] = status_code
+    ret['last_size'] = size
     return ret
 
 
+async def run_concurrent_requests(url, n, concurrency):
+    """Send n timed requests for an URL with at most concurrency in flight.
+
+    Each connection is warmed up before measuring so that connection setup
+    is not included. Returns a list of response times and the total time
+    taken by the timed requests, in nanoseconds.
+    """
+    import asyncio
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def timed_get(session):
+        async with sem:
+            start = time.perf_counter_ns()
+            async with session.get(url) as res:
+                await res.read()
+            resp_time = time.perf_counter_ns() - start
+            if res.status >= 400:
+                res.raise_for_status()
+            return resp_time
+
+    aiohttp = import_optional('aiohttp')
+    connector = aiohttp.TCPConnector(limit=concurrency, ssl=False)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, headers=REQUEST_HEADERS, timeout=timeout) as session:
+        await asyncio.gather(*(timed_get(session) for _ in range(min(n, concurrency))))
+        start = time.perf_counter_ns()
+        resp_times = await asyncio.gather(*(timed_get(session) for _ in range(n)))
+        return resp_times, time.perf_counter_ns() - start
+
+
+async def time_url_async(url, n, concurrency):
+    """Perform response time measurements for an URL using concurrent requests.
+
+    Returns a list of response times in nanoseconds.
+    """
+    resp_times, _ = await run_concurrent_requests(url, n, concurrency)
+    return resp_times
+
+
+async def throughput(url, total, conc):
+    """Measure the throughput of an URL over conc concurrent connections.
+
+    Returns the response times as calculated by calc_resp_times with the
+    total time and the number of requests per second added.
+    """
+    resp_times, total_time = await run_concurrent_requests(url, total, conc)
+    ret = calc_resp_times(resp_times)
+    ret['total_time'] = total_time / 1e9
+    ret['requests_per_second'] = total / ret['total_time']
+    return ret
+
+
+def calc_percentiles(resp_times):
+    """Calculate the 50th, 95th and 99th percentiles of response times.
+
+    resp_times are in nanoseconds, the percentiles are returned in seconds.
+    """
+    np = None
+    if len(resp_times) >= NUMPY_THRESHOLD:
+        np = import_optional('numpy')
+    if np is not None:
+        percentiles = np.percentile(np.asarray(resp_times, dtype=np.float64), [50, 95, 99]).tolist()
+    elif len(resp_times) > 1:
+        quantiles = statistics.quantiles(resp_times, n=100, method='inclusive')
+        percentiles = [quantiles[49], quantiles[94], quantiles[98]]
+    else:
+        percentiles = resp_times * 3
+    return {key: percentile / 1e9 for key, percentile in zip(['p50_time', 'p95_time', 'p99_time'], percentiles)}
+
+
 def calc_resp_times(resp_times):
-    """Calculate response times collected by time_url."""
-    first = True
-    ret = {'min_time': None, 'max_time': None, 'avg_time': None}
-    total_time = 0
-    for resp_time in resp_times:
-        if first:
-            ret['min_time'] = ret['max_time'] = resp_time
-            first = False
-        ret['min_time'] = min(ret['min_time'], resp_time)
-        ret['max_time'] = max(ret['max_time'], resp_time)
-        total_time += resp_time
-    ret['avg_time'] = total_time / len(resp_times)
+    """Calculate response times from a list of samples in nanoseconds.
+
+    time_url keeps a running min/max/average itself, this is used for
+    samples collected in other ways, such as by time_url_async.
+
+    Returns min, max and average times as well as the 50th, 95th and 99th
+    percentiles, all in seconds.
+    """
+    np = None
+    if len(resp_times) >= NUMPY_THRESHOLD:
+        np = import_optional('numpy')
+    if np is not None:
+        arr = np.asarray(resp_times, dtype=np.float64)
+        min_time, max_time, avg_time = arr.min(), arr.max(), arr.mean()
+    else:
+        min_time, max_time, avg_time = min(resp_times), max(resp_times), sum(resp_times) / len(resp_times)
+    ret = {'min_time': float(min_time) / 1e9, 'max_time': float(max_time) / 1e9, 'avg_time': float(avg_time) / 1e9}
+    ret.update(calc_percentiles(resp_times))
     return ret
 
 
 def display_url_info(url, include_headers=False):
     """Display information about an URL."""
-    r = requests.get(url, verify=False, headers=request_headers(), timeout=REQUEST_TIMEOUT)
-    print('Input URL: %s' % url)
-    print('Final URL: %s' % r.url)
-    print('HTTP status code: %d' % r.status_code)
-    print('Response size: %d' % len(r.text))
-    print('Number of redirects: %d' % len(r.history))
+    r = requests.get(url, verify=False, headers=REQUEST_HEADERS, timeout=REQUEST_TIMEOUT)
+    print(f'Input URL: {url}')
+    print(f'Final URL: {r.url}')
+    print(f'HTTP status code: {r.status_code}')
+    print(f'Response size: {len(r.content)}')
+    print(f'Number of redirects: {len(r.history)}')
     if len(r.history) > 0:
         urls = [h.url for h in r.history] + [r.url]
-        print('URL history: %s' % (' '.join(urls)))
+        print(f'URL history: {" ".join(urls)}')
     if include_headers:
         print()
         print('Headers:')
         for key, value in r.headers.items():
-            print('%s: %s' % (key, value))
+            print(f'{key}: {value}')
     else:
-        print('Content-type: %s' % r.headers.get('content-type'))
+        print(f'Content-type: {r.headers.get("content-type")}')
 
 
 def loop_url(url, delay=10, use_keepalive=True, verbose=False):
     """Enter an endless loop that keeps requesting the same URL."""
+    write = sys.stdout.write
+    flush = sys.stdout.flush
     while True:
         now = datetime.datetime.now()
         if verbose:
-            print('%04d-%02d-%02d %02d:%02d:%02d: ' % (now.year, now.month, now.day, now.hour, now.minute, now.second), end='', flush=True)
+            write(f'{now:%Y-%m-%d %H:%M:%S}: ')
         else:
-            print('%02d:%02d:%02d: ' % (now.hour, now.minute, now.second), end='', flush=True)
+            write(f'{now:%H:%M:%S}: ')
+        flush()
         try:
             res = time_url(url, num_requests=1, display_progress=False, use_keepalive=use_keepalive)
         except Exception as e:
-            print('ERROR: %s' % str(e))
+            write(f'ERROR: {e}\n')
         else:
             if verbose:
-                print('%.04fs  retcode: %s, size: %s' % (res['min_time'], res['last_status_code'], res['last_size']), flush=True)
+                write(f"{res['min_time']:.4f}s  retcode: {res['last_status_code']}, size: {res['last_size']}\n")
             else:
-                print('%.04f' % res['min_time'], flush=True)
+                write(f"{res['min_time']:.4f}\n")
+        flush()
+        time.sleep(delay)
+
+
+def loop_url_csv(url, csv_fd, delay=10, use_keepalive=True):
+    """Enter an endless loop that keeps requesting the same URL, logging as CSV.
+
+    A timestamp,duration,status,size row is written to csv_fd for each
+    request, with the timestamp and duration in nanoseconds and the size of
+    the response body in bytes after content decoding. Errors are printed to
+    stderr.
+    """
+    while True:
+        timestamp = time.time_ns()
+        try:
+            res = time_url(url, num_requests=1, display_progress=False, use_keepalive=use_keepalive)
+        except Exception as e:
+            print(f'{datetime.datetime.fromtimestamp(timestamp / 1e9):%Y-%m-%d %H:%M:%S}: ERROR: {e}',
+                  file=sys.stderr)
+        else:
+            os.write(csv_fd, b'%d,%d,%d,%d\n' % (timestamp, round(res['min_time'] * 1e9),
+                                                  res['last_status_code'], res['last_size']))
         time.sleep(delay)
 
 
@@ -137,13 +513,23 @@ def parse_args():
     parser.add_argument('-n', '--requests', default=5, type=int, help='number of requests to run')
     parser.add_argument('--no-keepalive', default=True, dest='keepalive', action='store_false',
                         help='disable http keepalive')
+    parser.add_argument('-c', '--concurrency', default=None, type=int,
+                        help='number of requests to run concurrently (requires aiohttp)')
+    parser.add_argument('--throughput', default=None, type=int, metavar='N',
+                        help='measure throughput sending the requests over N concurrent connections '
+                             '(requires aiohttp)')
+    parser.add_argument('--curl', default=False, action='store_true',
+                        help='send requests using libcurl (requires pycurl)')
     parser.add_argument('--single', default=False, dest='single', action='store_true',
                         help='only send a single request, try to avoid cached responses')
     parser.add_argument('-l', '--loop', default=False, action='store_true',
                         help='loop sending requests forever')
     parser.add_argument('--loop-delay', default=10, type=int, help='delay between requests with -l')
+    parser.add_argument('--csv', metavar='FILE',
+                        help='with -l, append timestamp_ns,duration_ns,status,size rows to FILE instead of '
+                             'printing, size is the response body size in bytes after content decoding')
     parser.add_argument('--loop-verbose', default=False, action='store_true',
-                        help='include size and retcode when using -l')
+                        help='include retcode and size (response body bytes after content decoding) when using -l')
     parser.add_argument('-i', '--info', default=False, action='store_true',
                         help='display http response information')
     parser.add_argument('-H', '--display-headers', default=False, dest='headers', action='store_true',
@@ -156,52 +542,132 @@ def parse_args():
                         help='spoof a Chrome user agent')
     parser.add_argument('url', help='URL to check')
     args = parser.parse_args()
+    if args.concurrency is not None:
+        if args.concurrency < 1:
+            parser.error('--concurrency must be at least 1')
+        if not args.keepalive or args.single:
+            parser.error('--concurrency can not be used with --no-keepalive or --single')
+        if args.loop or args.info:
+            parser.error('--concurrency can not be used with -l or -i')
+        if import_optional('aiohttp') is None:
+            parser.error('--concurrency requires aiohttp')
+    if args.throughput is not None:
+        if args.throughput < 1:
+            parser.error('--throughput must be at least 1')
+        if not args.keepalive or args.single:
+            parser.error('--throughput can not be used with --no-keepalive or --single')
+        if args.loop or args.info:
+            parser.error('--throughput can not be used with -l or -i')
+        if args.concurrency or args.curl:
+            parser.error('--throughput can not be used with --concurrency or --curl')
+        if import_optional('aiohttp') is None:
+            parser.error('--throughput requires aiohttp')
+    if args.csv and not args.loop:
+        parser.error('--csv can only be used with -l')
+    if args.curl and import_optional('pycurl') is None:
+        parser.error('--curl requires pycurl')
+    if args.curl and args.concurrency:
+        parser.error('--curl can not be used with --concurrency')
+    if args.curl and (args.loop or args.info):
+        parser.error('--curl can not be used with -l or -i')
     return args
 
 
-def print_using_url(url):
-    url_ip = socket.gethostbyname(get_url_hostname(url))
-    print('Testing URL: %s (%s)' % (url, url_ip))
+def print_using_url(p_url, url_ip):
+    print(f'Testing URL: {p_url.geturl()} ({url_ip})')
+
+
+def pin_url_host(p_url):
+    """Resolve the hostname of a parsed URL once and pin it for future requests.
+
+    Returns the preferred address.
+    """
+    addresses = resolve_host(p_url.hostname)
+    pin_host_addresses(p_url.hostname, addresses)
+    return addresses[0]
 
 
 def main():
     args = parse_args()
-    url = args.url
+    socket.setdefaulttimeout(REQUEST_TIMEOUT)
     if args.single:
         args.requests = 1
         args.keepalive = False
     if args.ua_spoof:
-        request_headers()['User-Agent'] = CHROME_USER_AGENT
-    if '://' not in url:
-        url = 'http://%s' % url
+        REQUEST_HEADERS['User-Agent'] = CHROME_USER_AGENT
+    if '://' in args.url:
+        p_url = urlsplit(args.url)
+    else:
+        p_url = urlsplit(f'http://{args.url}')
+    url = p_url.geturl()
     if args.loop:
-        redir_url = get_redirected_url(url)
+        p_redir_url = urlsplit(get_redirected_url(url))
+        redir_url = p_redir_url.geturl()
+        url_ip = pin_url_host(p_redir_url)
         if not args.parsable:
-            print_using_url(redir_url)
-        loop_url(redir_url, args.loop_delay, args.keepalive, args.loop_verbose)
+            print_using_url(p_redir_url, url_ip)
+        if args.csv:
+            csv_fd = os.open(args.csv, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                loop_url_csv(redir_url, csv_fd, args.loop_delay, args.keepalive)
+            finally:
+                os.close(csv_fd)
+        else:
+            loop_url(redir_url, args.loop_delay, args.keepalive, args.loop_verbose)
     elif args.info:
         display_url_info(url, args.headers)
     else:
+        session = None
         if args.single:
-            redir_url = url
+            p_redir_url = p_url
+        elif args.keepalive and not (args.concurrency or args.curl or args.throughput):
+            redir_url, session = get_redirected_url_and_session(url)
+            p_redir_url = urlsplit(redir_url)
         else:
-            redir_url = get_redirected_url(url)
+            p_redir_url = urlsplit(get_redirected_url(url))
+        redir_url = p_redir_url.geturl()
+        url_ip = pin_url_host(p_redir_url)
         if not args.parsable:
-            print_using_url(redir_url)
+            print_using_url(p_redir_url, url_ip)
         display_progress = True
         if args.parsable or args.report:
             display_progress = False
-        resp = time_url(redir_url, args.requests, display_progress, args.keepalive)
+        # asyncio is only imported by the modes using it to keep startup fast
+        if args.throughput:
+            import asyncio
+            resp = asyncio.run(throughput(redir_url, args.requests, args.throughput))
+        elif args.concurrency:
+            import asyncio
+            resp = calc_resp_times(asyncio.run(time_url_async(redir_url, args.requests, args.concurrency)))
+        elif args.curl:
+            resp = time_url_curl(redir_url, args.requests, display_progress, args.keepalive)
+        else:
+            resp = time_url(redir_url, args.requests, display_progress, args.keepalive, session)
         if args.parsable:
-            print('%.04f %.04f %.04f' % (resp['min_time'], resp['max_time'], resp['avg_time']))
+            if args.throughput:
+                print(f"{resp['min_time']:.4f} {resp['max_time']:.4f} {resp['avg_time']:.4f} "
+                      f"{resp['requests_per_second']:.1f} {resp['p50_time']:.4f} {resp['p95_time']:.4f} "
+                      f"{resp['p99_time']:.4f}")
+            else:
+                print(f"{resp['min_time']:.4f} {resp['max_time']:.4f} {resp['avg_time']:.4f}")
         elif args.report:
-            print('Response times in seconds (tested %d times):' % args.requests)
-            print('Average: %.04f' % (resp['avg_time']))
-            print('Minimum: %.04f' % (resp['min_time']))
-            print('Maximum: %.04f' % (resp['max_time']))
+            print(f'Response times in seconds (tested {args.requests} times):')
+            print(f"Average: {resp['avg_time']:.4f}")
+            print(f"Minimum: {resp['min_time']:.4f}")
+            print(f"Maximum: {resp['max_time']:.4f}")
+            if args.throughput:
+                print(f"50th percentile: {resp['p50_time']:.4f}")
+                print(f"95th percentile: {resp['p95_time']:.4f}")
+                print(f"99th percentile: {resp['p99_time']:.4f}")
+                print(f"Throughput ({args.throughput} connections): {resp['requests_per_second']:.1f} requests/s")
         else:
-            print('Response times (s): min: %.04f max: %.04f avg: %.04f' % (
-                resp['min_time'], resp['max_time'], resp['avg_time']))
+            print(f"Response times (s): min: {resp['min_time']:.4f} max: {resp['max_time']:.4f} "
+                  f"avg: {resp['avg_time']:.4f}")
+            if args.throughput:
+                print(f"Percentiles (s): p50: {resp['p50_time']:.4f} p95: {resp['p95_time']:.4f} "
+                      f"p99: {resp['p99_time']:.4f}")
+                print(f"Throughput: {resp['requests_per_second']:.1f} requests/s "
+                      f"({args.throughput} connections)")
 
 
 if __name__ == '__main__':
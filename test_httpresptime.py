@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+import httpresptime
+
+
+@pytest.fixture
+def resp_times():
+    rand = random.Random(0)
+    return [rand.randrange(1000000, 100000000) for _ in range(200)]
+
+
+def test_calc_resp_times_small():
+    ret = httpresptime.calc_resp_times([1000000000, 3000000000])
+    assert ret['min_time'] == 1.0
+    assert ret['max_time'] == 3.0
+    assert ret['avg_time'] == 2.0
+    assert ret['p50_time'] == pytest.approx(2.0)
+    assert ret['p99_time'] == pytest.approx(2.98)
+
+
+def test_calc_percentiles_single_sample():
+    assert httpresptime.calc_percentiles([5000000]) == {'p50_time': 0.005, 'p95_time': 0.005, 'p99_time': 0.005}
+
+
+def test_calc_resp_times_numpy_matches_statistics(resp_times, monkeypatch):
+    pytest.importorskip('numpy')
+    expected = httpresptime.calc_resp_times(resp_times)
+    monkeypatch.setattr(httpresptime, 'NUMPY_THRESHOLD', 1)
+    ret = httpresptime.calc_resp_times(resp_times)
+    assert ret.keys() == expected.keys()
+    for key, value in expected.items():
+        assert ret[key] == pytest.approx(value)